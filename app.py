@@ -3,29 +3,114 @@ File Parser Agent - Web Application
 Converts PDF, Word, Excel, and PowerPoint files to JSON or Markdown
 """
 
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Request, render_template, request, jsonify, send_file, url_for
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
 from werkzeug.utils import secure_filename
 import os
-import json
+import hashlib
+import io
+import importlib
+import mimetypes
+import threading
+import zipfile
+import orjson
+from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
+from tempfile import TemporaryFile
+from types import MappingProxyType
+from urllib.parse import quote
 
-# Import parsers
-from parsers.pdf_parser import parse_pdf
-from parsers.word_parser import parse_word
-from parsers.excel_parser import parse_excel
-from parsers.pptx_parser import parse_pptx
+def _lazy_parser(module_name, func_name):
+    """Defer importing a parser (and its PDF/Office library) until first use"""
+    parser = None
+
+    def load(*args, **kwargs):
+        nonlocal parser
+        if parser is None:
+            parser = getattr(importlib.import_module(module_name), func_name)
+        return parser(*args, **kwargs)
+
+    load.__name__ = func_name
+    return load
+
+# Parsers are imported on first use to keep startup fast
+parse_pdf = _lazy_parser('parsers.pdf_parser', 'parse_pdf')
+parse_word = _lazy_parser('parsers.word_parser', 'parse_word')
+parse_excel = _lazy_parser('parsers.excel_parser', 'parse_excel')
+parse_pptx = _lazy_parser('parsers.pptx_parser', 'parse_pptx')
+
+class UploadRequest(Request):
+    """Request that keeps typical uploads in memory while they are received"""
+
+    # werkzeug's default spools anything over 500KB to a temp file on disk;
+    # bodies up to this size stay in memory instead
+    spool_max_size = 8 * 1024 * 1024
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Plain BytesIO/TemporaryFile rather than SpooledTemporaryFile, which
+        # lacks the seekable() that zipfile needs before Python 3.11
+        if total_content_length is not None and total_content_length <= self.spool_max_size:
+            return io.BytesIO()
+        return TemporaryFile('rb+')
+
+class OrjsonProvider(JSONProvider):
+    """Serialize JSON responses with orjson instead of the stdlib encoder"""
+
+    option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=str, option=self.option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping a decode/encode
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=str, option=self.option), mimetype='application/json')
 
 app = Flask(__name__)
+app.request_class = UploadRequest
+app.json = OrjsonProvider(app)
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
-app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'outputs'
-
-# Ensure directories exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
-
-ALLOWED_EXTENSIONS = {
+# Let Apache/lighttpd (mod_xsendfile) stream downloads instead of Python
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+# nginx equivalent: internal location aliased to the outputs directory
+app.config['X_ACCEL_REDIRECT_PREFIX'] = os.environ.get('X_ACCEL_REDIRECT_PREFIX', '')
+# Parsed JSON compresses well; level 4 keeps CPU cost low. Compression is
+# opt-in per route so /download keeps streaming (and X-Sendfile/X-Accel-Redirect
+# header-only responses and ETags stay untouched).
+app.config['COMPRESS_REGISTER'] = False
+app.config['COMPRESS_MIMETYPES'] = ['application/json']
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_LEVEL'] = 4
+app.config['COMPRESS_BR_LEVEL'] = 4
+compress = Compress(app)
+
+WRITE_CHUNK_SIZE = 1 << 20  # 1MB slices when writing outputs
+# Recently parsed documents are kept in memory, per worker process. Only
+# small uploads are cached, and the cache is bounded by an estimate of the
+# memory its results take: upload size times a rough expansion factor.
+PARSE_CACHE_MAX_UPLOAD = 2 * 1024 * 1024
+PARSE_CACHE_BYTES = 64 * 1024 * 1024
+PARSE_CACHE_EXPANSION = 10
+
+# (parser name, content digest) -> (parsed data, estimated size), oldest first
+_parse_cache = OrderedDict()
+_parse_cache_lock = threading.Lock()
+_parse_cache_bytes = 0
+
+# Resolve the output directory once; every output path is built from it
+OUTPUT_DIR = Path(app.config['OUTPUT_FOLDER']).resolve()
+
+# Ensure output directory exists
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+ALLOWED_EXTENSIONS = MappingProxyType({
     'pdf': parse_pdf,
     'docx': parse_word,
     'doc': parse_word,
@@ -33,23 +118,165 @@ ALLOWED_EXTENSIONS = {
     'xls': parse_excel,
     'pptx': parse_pptx,
     'ppt': parse_pptx
-}
-
-def allowed_file(filename):
-    """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+})
+
+# Built once for error messages instead of per rejected upload
+SUPPORTED_EXTENSIONS = ', '.join(ALLOWED_EXTENSIONS)
+
+def get_extension(filename):
+    """Get lowercased file extension, or '' if there is none"""
+    _, sep, ext = filename.rpartition('.')
+    return ext.lower() if sep else ''
+
+# Zip members that identify each Office Open XML format
+OOXML_MARKERS = (
+    ('word/document.xml', 'docx'),
+    ('xl/workbook.xml', 'xlsx'),
+    ('ppt/presentation.xml', 'pptx')
+)
+
+def sniff_extension(stream):
+    """Guess a file's extension from its content, or '' if it is not recognised"""
+    head = stream.read(5)
+    stream.seek(0)
+
+    if head == b'%PDF-':
+        return 'pdf'
+
+    if head.startswith(b'PK\x03\x04'):
+        try:
+            with zipfile.ZipFile(stream) as archive:
+                names = set(archive.namelist())
+        except Exception:
+            # Damaged archives can raise BadZipFile, NotImplementedError,
+            # EOFError and others; any of them just means "not recognised"
+            names = set()
+        finally:
+            stream.seek(0)
+
+        for marker, ext in OOXML_MARKERS:
+            if marker in names:
+                return ext
+
+    return ''
+
+def hash_stream(stream):
+    """Digest a binary stream's content and rewind it"""
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in iter(lambda: stream.read(WRITE_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.digest()
+
+def stream_size(stream):
+    """Byte length of a seekable stream, which is left rewound"""
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(0)
+    return size
+
+def parse_cached(parser, stream, filename):
+    """Parse a stream, reusing the result of a recent parse of identical content"""
+    global _parse_cache_bytes
+
+    # Large uploads would dominate the cache, so they skip it (and the hashing)
+    upload_size = stream_size(stream)
+    if upload_size > PARSE_CACHE_MAX_UPLOAD:
+        return parser(stream, filename=filename)
+
+    key = (parser.__name__, hash_stream(stream))
+
+    with _parse_cache_lock:
+        entry = _parse_cache.get(key)
+        if entry is not None:
+            _parse_cache.move_to_end(key)
+
+    if entry is not None:
+        parsed_data = entry[0]
+    else:
+        parsed_data = parser(stream, filename=filename)
+        # Failed parses are not cached so a retry gets a fresh attempt
+        if 'error' not in parsed_data:
+            # Weighed from the upload size; measuring the result would cost a
+            # full extra serialization on every miss
+            size = upload_size * PARSE_CACHE_EXPANSION
+            with _parse_cache_lock:
+                if key not in _parse_cache:
+                    _parse_cache[key] = (parsed_data, size)
+                    _parse_cache_bytes += size
+                    while _parse_cache_bytes > PARSE_CACHE_BYTES:
+                        _parse_cache_bytes -= _parse_cache.popitem(last=False)[1][1]
+
+    # Same content may arrive under a different name
+    return {**parsed_data, 'filename': filename}
+
+def summarize(parsed_data):
+    """Small overview of a parse result for the upload response"""
+    summary = {'file_type': parsed_data.get('file_type')}
+
+    for key in ('total_pages', 'total_paragraphs', 'total_tables'):
+        if key in parsed_data:
+            summary[key] = parsed_data[key]
+
+    metadata = parsed_data.get('metadata', {})
+    for key in ('total_sheets', 'total_slides'):
+        if key in metadata:
+            summary[key] = metadata[key]
+
+    if 'error' in parsed_data:
+        summary['error'] = parsed_data['error']
+
+    return summary
+
+def get_output_path(filename):
+    """Resolve an output filename inside OUTPUT_DIR, or None if it points elsewhere"""
+    try:
+        path = (OUTPUT_DIR / filename).resolve()
+    except (ValueError, OSError):
+        # e.g. an embedded null byte in the requested name
+        return None
+    return path if path.parent == OUTPUT_DIR else None
+
+def create_output(stem, ext, mode, **kwargs):
+    """Exclusively create a new output file, numbering the name if it is taken
+
+    Returns (output filename, open file object).
+    """
+    name = f"{stem}.{ext}"
+    counter = 1
+    while True:
+        try:
+            # 'x' fails if the file exists, so concurrent uploads of the same
+            # name in the same second can never overwrite each other
+            return name, open(OUTPUT_DIR / name, mode, **kwargs)
+        except FileExistsError:
+            name = f"{stem}_{counter}.{ext}"
+            counter += 1
 
 def get_parser(filename):
-    """Get appropriate parser for file type"""
-    ext = filename.rsplit('.', 1)[1].lower()
-    return ALLOWED_EXTENSIONS.get(ext)
+    """Get appropriate parser for file type, or None if it is not supported"""
+    return ALLOWED_EXTENSIONS.get(get_extension(filename))
+
+# (html, etag) of the rendered main page; the template has no per-request data
+_index_page = None
 
 @app.route('/')
 def index():
     """Main page"""
-    return render_template('index.html')
+    global _index_page
+    # Re-render while debugging so template edits still show up
+    if _index_page is None or app.debug:
+        html = render_template('index.html')
+        _index_page = (html, hashlib.blake2b(html.encode('utf-8'), digest_size=16).hexdigest())
+
+    html, etag = _index_page
+    response = app.response_class(html, mimetype='text/html')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response.make_conditional(request)
 
 @app.route('/upload', methods=['POST'])
+@compress.compressed()
 def upload_file():
     """Handle file upload and parsing"""
     if 'file' not in request.files:
@@ -57,47 +284,66 @@ def upload_file():
 
     file = request.files['file']
     output_format = request.form.get('format', 'json')  # json or markdown
+    pretty = request.values.get('pretty') == '1'  # indent JSON output only on request
+    save_output = request.values.get('save_output', 'true').lower() != 'false'
+    # Without a saved file the parsed data is the only result, so always return it
+    include_data = not save_output or request.values.get('include_data') == '1'
 
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
 
-    if not allowed_file(file.filename):
-        return jsonify({'error': f'File type not supported. Allowed: {", ".join(ALLOWED_EXTENSIONS.keys())}'}), 400
+    # Resolve the parser once from the original name; secure_filename can
+    # strip non-ASCII stems down to just the extension. Uploads with a
+    # missing or unknown extension fall back to their leading bytes.
+    ext = get_extension(file.filename)
+    parser = get_parser(file.filename)
+    if parser is None:
+        ext = sniff_extension(file.stream)
+        parser = ALLOWED_EXTENSIONS.get(ext)
+    if parser is None:
+        return jsonify({'error': f'File type not supported. Allowed: {SUPPORTED_EXTENSIONS}'}), 400
 
     try:
-        # Save uploaded file
-        filename = secure_filename(file.filename)
+        # secure_filename drops non-ASCII characters, so a name like "отчёт"
+        # comes back empty; give those uploads a generic name
+        filename = secure_filename(file.filename) or f"upload.{ext}"
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        unique_filename = f"{timestamp}_{filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(filepath)
-
-        # Parse file
-        parser = get_parser(filename)
-        parsed_data = parser(filepath)
-
-        # Generate output file
-        output_filename = f"{Path(filename).stem}_{timestamp}.{output_format}"
-        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-
-        if output_format == 'json':
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(parsed_data, f, indent=2, ensure_ascii=False)
-        else:  # markdown
-            markdown_content = convert_to_markdown(parsed_data)
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(markdown_content)
-
-        # Clean up uploaded file
-        os.remove(filepath)
-
-        return jsonify({
+
+        # Parse straight from the upload stream; werkzeug has already
+        # spooled the body, so there is no need to copy it to disk again.
+        # Re-uploads of the same document reuse the earlier result.
+        parsed_data = parse_cached(parser, file.stream, filename)
+
+        # Generate output file (skipped when the caller only wants parsed_data)
+        output_filename = None
+        if save_output:
+            output_stem = f"{Path(filename).stem}_{timestamp}"
+
+            if output_format == 'json':
+                output_filename, f = create_output(output_stem, output_format, 'xb', buffering=WRITE_CHUNK_SIZE)
+                # default=str covers library objects (e.g. PDF metadata values) orjson can't encode
+                option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+                with f:
+                    f.write(orjson.dumps(parsed_data, default=str, option=option))
+            else:  # markdown
+                output_filename, f = create_output(output_stem, output_format, 'x', encoding='utf-8', buffering=WRITE_CHUNK_SIZE)
+                # Stream chunks straight to disk; the full document is never built as one string
+                with f:
+                    f.writelines(iter_markdown(parsed_data))
+
+        response = {
             'success': True,
             'filename': output_filename,
             'original_filename': filename,
             'format': output_format,
-            'parsed_data': parsed_data
-        })
+            'summary': summarize(parsed_data)
+        }
+        if output_filename:
+            response['download_url'] = url_for('download_file', filename=output_filename)
+        if include_data:
+            response['parsed_data'] = parsed_data
+
+        return jsonify(response)
 
     except Exception as e:
         return jsonify({'error': f'Error processing file: {str(e)}'}), 500
@@ -105,72 +351,131 @@ def upload_file():
 @app.route('/download/<filename>')
 def download_file(filename):
     """Download parsed file"""
-    filepath = os.path.join(app.config['OUTPUT_FOLDER'], secure_filename(filename))
-    if os.path.exists(filepath):
+    # Output names are ours, so a containment check replaces secure_filename
+    filepath = get_output_path(filename)
+    if filepath is not None and filepath.is_file():
+        accel_prefix = app.config['X_ACCEL_REDIRECT_PREFIX']
+        if accel_prefix:
+            # Let nginx stream the file; the worker only sends headers
+            mimetype = mimetypes.guess_type(filepath.name)[0] or 'application/octet-stream'
+            response = app.response_class(mimetype=mimetype)
+            response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{quote(filepath.name)}"
+            response.headers.set('Content-Disposition', 'attachment', filename=filepath.name)
+            return response
+        # send_file answers Range/If-Modified-Since requests and uses the
+        # server's wsgi.file_wrapper (sendfile) when one is available
         return send_file(filepath, as_attachment=True)
     return jsonify({'error': 'File not found'}), 404
 
 @app.route('/list-outputs')
+@compress.compressed()
 def list_outputs():
     """List all parsed output files"""
-    files = []
-    output_dir = app.config['OUTPUT_FOLDER']
-
-    for filename in os.listdir(output_dir):
-        filepath = os.path.join(output_dir, filename)
-        if os.path.isfile(filepath):
-            files.append({
-                'filename': filename,
-                'size': os.path.getsize(filepath),
-                'created': datetime.fromtimestamp(os.path.getctime(filepath)).isoformat()
-            })
-
-    return jsonify({'files': sorted(files, key=lambda x: x['created'], reverse=True)})
-
-def convert_to_markdown(data):
-    """Convert parsed data to Markdown format"""
-    md = []
-
+    # scandir reuses one stat per entry for the type, size and ctime
+    with os.scandir(OUTPUT_DIR) as entries:
+        stats = [(entry.name, entry.stat()) for entry in entries if entry.is_file()]
+
+    stats.sort(key=lambda item: item[1].st_ctime, reverse=True)
+
+    files = [{
+        'filename': name,
+        'size': st.st_size,
+        'created': datetime.fromtimestamp(st.st_ctime).isoformat(timespec='seconds')
+    } for name, st in stats]
+
+    return jsonify({'files': files})
+
+def _escape_cell(cell):
+    """Stringify a table cell so it cannot break the Markdown table"""
+    text = str(cell).replace('|', '\\|')
+    # Line breaks inside a cell (Alt+Enter in Excel) would end the row
+    if '\n' in text or '\r' in text:
+        text = text.replace('\r\n', '<br>').replace('\r', '<br>').replace('\n', '<br>')
+    return text
+
+def _pdf_markdown(data):
+    """Markdown body for a parsed PDF"""
+    yield "## PDF Content\n\n"
+    for page in data.get('pages', []):
+        yield f"### Page {page['page_number']}\n\n{page['text']}\n\n"
+
+# Word paragraph style -> Markdown heading prefix, nested under "## Document Content"
+_HEADING_PREFIX = MappingProxyType({
+    'Heading 1': '### ',
+    'Heading 2': '#### ',
+    'Heading 3': '##### ',
+    'Heading 4': '##### ',
+    'Heading 5': '##### ',
+    'Heading 6': '##### ',
+    'Normal': ''
+})
+
+def _word_markdown(data):
+    """Markdown body for a parsed Word document"""
+    yield "## Document Content\n\n"
+    for para in data.get('paragraphs', []):
+        style = para.get('style', '')
+        prefix = _HEADING_PREFIX.get(style)
+        if prefix is None:
+            # Less common styles, e.g. "Heading 7" or a custom "Heading Accent"
+            prefix = '##### ' if 'Heading' in style else ''
+        yield f"{prefix}{para['text']}\n\n"
+
+@lru_cache(maxsize=64)
+def _separator_row(col_count):
+    """Markdown table separator for a given column count"""
+    return "| " + " | ".join(["---"] * col_count) + " |"
+
+def _table_markdown(rows):
+    """Markdown table for a non-empty list of rows, the first being the header"""
+    # Preallocate header + separator + body so no row is ever shifted or appended
+    lines = [None] * (len(rows) + 1)
+    lines[0] = "| " + " | ".join(map(_escape_cell, rows[0])) + " |"
+    lines[1] = _separator_row(len(rows[0]))
+    for i in range(1, len(rows)):
+        lines[i + 1] = "| " + " | ".join(map(_escape_cell, rows[i])) + " |"
+    return "\n".join(lines)
+
+def _excel_markdown(data):
+    """Markdown body for a parsed spreadsheet, one table per sheet"""
+    yield "## Spreadsheet Data\n\n"
+    for sheet in data.get('sheets', []):
+        yield f"### Sheet: {sheet['name']}\n\n"
+        rows = sheet.get('data')
+        if rows:
+            yield _table_markdown(rows)
+            yield "\n\n"
+
+def _powerpoint_markdown(data):
+    """Markdown body for a parsed presentation"""
+    yield "## Presentation Slides\n\n"
+    for slide in data.get('slides', []):
+        title = f"**Title:** {slide['title']}\n\n" if slide.get('title') else ''
+        text = f"{slide['text']}\n\n" if slide.get('text') else ''
+        yield f"### Slide {slide['slide_number']}\n\n{title}{text}"
+
+# file_type -> generator of Markdown body chunks
+MARKDOWN_EMITTERS = MappingProxyType({
+    'pdf': _pdf_markdown,
+    'word': _word_markdown,
+    'excel': _excel_markdown,
+    'powerpoint': _powerpoint_markdown
+})
+
+def iter_markdown(data):
+    """Yield parsed data as Markdown, one page/sheet/slide at a time"""
     # Add metadata
-    md.append(f"# {data.get('filename', 'Parsed Document')}\n")
-    md.append(f"**File Type:** {data.get('file_type', 'Unknown')}\n")
-    md.append(f"**Parsed:** {data.get('parsed_at', '')}\n")
-    md.append("\n---\n\n")
+    yield (
+        f"# {data.get('filename', 'Parsed Document')}\n"
+        f"**File Type:** {data.get('file_type', 'Unknown')}\n"
+        f"**Parsed:** {data.get('parsed_at', '')}\n"
+        "\n---\n\n"
+    )
 
     # Add content based on file type
-    if data.get('file_type') == 'pdf':
-        md.append("## PDF Content\n\n")
-        for page in data.get('pages', []):
-            md.append(f"### Page {page['page_number']}\n\n")
-            md.append(f"{page['text']}\n\n")
-
-    elif data.get('file_type') == 'word':
-        md.append("## Document Content\n\n")
-        for para in data.get('paragraphs', []):
-            md.append(f"{para}\n\n")
-
-    elif data.get('file_type') == 'excel':
-        md.append("## Spreadsheet Data\n\n")
-        for sheet in data.get('sheets', []):
-            md.append(f"### Sheet: {sheet['name']}\n\n")
-            if sheet.get('data'):
-                # Create markdown table
-                md.append("| " + " | ".join(str(cell) for cell in sheet['data'][0]) + " |\n")
-                md.append("| " + " | ".join("---" for _ in sheet['data'][0]) + " |\n")
-                for row in sheet['data'][1:]:
-                    md.append("| " + " | ".join(str(cell) for cell in row) + " |\n")
-                md.append("\n")
-
-    elif data.get('file_type') == 'powerpoint':
-        md.append("## Presentation Slides\n\n")
-        for slide in data.get('slides', []):
-            md.append(f"### Slide {slide['slide_number']}\n\n")
-            if slide.get('title'):
-                md.append(f"**Title:** {slide['title']}\n\n")
-            if slide.get('text'):
-                md.append(f"{slide['text']}\n\n")
-
-    return ''.join(md)
+    emitter = MARKDOWN_EMITTERS.get(data.get('file_type'))
+    if emitter:
+        yield from emitter(data)
 
 if __name__ == '__main__':
     print("\n" + "="*50)
@@ -182,4 +487,19 @@ if __name__ == '__main__':
         print(f"  - .{ext}")
     print("\n" + "="*50 + "\n")
 
-    app.run(debug=True, port=5000, host='0.0.0.0')
+    host = '0.0.0.0'
+    port = 5000
+
+    if os.environ.get('FILE_PARSER_SERVER') == 'gunicorn':
+        # Hand the process over to gunicorn so uploads are parsed concurrently;
+        # gthread workers let parsing threads overlap while the C libraries run
+        os.execvp('gunicorn', [
+            'gunicorn', '-k', 'gthread',
+            '--workers', str(os.cpu_count() or 1),
+            '--threads', '4',
+            '--max-requests', '1000',
+            f'--bind={host}:{port}',
+            'wsgi:application'
+        ])
+
+    app.run(debug=True, port=port, host=host)
@@ -1,21 +1,23 @@
 """Excel Parser - Extract data from Excel spreadsheets"""
 
 import openpyxl
+import os
 from datetime import datetime
 from pathlib import Path
 
-def parse_excel(filepath):
+def parse_excel(filepath, filename=None):
     """
     Parse Excel file and extract sheet data
 
     Args:
-        filepath: Path to Excel file
+        filepath: Path to Excel file, or a binary file-like object
+        filename: Name to report in the result (required for file-like input)
 
     Returns:
         dict: Parsed Excel data
     """
     result = {
-        'filename': Path(filepath).name,
+        'filename': filename or (Path(filepath).name if isinstance(filepath, (str, os.PathLike)) else ''),
         'file_type': 'excel',
         'parsed_at': datetime.now().isoformat(),
         'sheets': [],
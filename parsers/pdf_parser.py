@@ -1,21 +1,23 @@
 """PDF Parser - Extract text and metadata from PDF files"""
 
 import PyPDF2
+import os
 from datetime import datetime
 from pathlib import Path
 
-def parse_pdf(filepath):
+def parse_pdf(filepath, filename=None):
     """
     Parse PDF file and extract text content
 
     Args:
-        filepath: Path to PDF file
+        filepath: Path to PDF file, or a binary file-like object
+        filename: Name to report in the result (required for file-like input)
 
     Returns:
         dict: Parsed PDF data
     """
     result = {
-        'filename': Path(filepath).name,
+        'filename': filename or (Path(filepath).name if isinstance(filepath, (str, os.PathLike)) else ''),
         'file_type': 'pdf',
         'parsed_at': datetime.now().isoformat(),
         'pages': [],
@@ -23,28 +25,28 @@ def parse_pdf(filepath):
     }
 
     try:
-        with open(filepath, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-
-            # Extract metadata
-            if pdf_reader.metadata:
-                result['metadata'] = {
-                    'title': pdf_reader.metadata.get('/Title', ''),
-                    'author': pdf_reader.metadata.get('/Author', ''),
-                    'subject': pdf_reader.metadata.get('/Subject', ''),
-                    'creator': pdf_reader.metadata.get('/Creator', ''),
-                }
-
-            # Extract text from each page
-            result['total_pages'] = len(pdf_reader.pages)
-
-            for page_num, page in enumerate(pdf_reader.pages, start=1):
-                text = page.extract_text()
-                result['pages'].append({
-                    'page_number': page_num,
-                    'text': text.strip(),
-                    'char_count': len(text)
-                })
+        # PdfReader accepts either a path or an open binary stream
+        pdf_reader = PyPDF2.PdfReader(filepath)
+
+        # Extract metadata
+        if pdf_reader.metadata:
+            result['metadata'] = {
+                'title': pdf_reader.metadata.get('/Title', ''),
+                'author': pdf_reader.metadata.get('/Author', ''),
+                'subject': pdf_reader.metadata.get('/Subject', ''),
+                'creator': pdf_reader.metadata.get('/Creator', ''),
+            }
+
+        # Extract text from each page
+        result['total_pages'] = len(pdf_reader.pages)
+
+        for page_num, page in enumerate(pdf_reader.pages, start=1):
+            text = page.extract_text()
+            result['pages'].append({
+                'page_number': page_num,
+                'text': text.strip(),
+                'char_count': len(text)
+            })
 
     except Exception as e:
         result['error'] = str(e)
@@ -1,21 +1,23 @@
 """PowerPoint Parser - Extract text and content from PPTX files"""
 
 from pptx import Presentation
+import os
 from datetime import datetime
 from pathlib import Path
 
-def parse_pptx(filepath):
+def parse_pptx(filepath, filename=None):
     """
     Parse PowerPoint file and extract slide content
 
     Args:
-        filepath: Path to PPTX file
+        filepath: Path to PPTX file, or a binary file-like object
+        filename: Name to report in the result (required for file-like input)
 
     Returns:
         dict: Parsed PowerPoint data
     """
     result = {
-        'filename': Path(filepath).name,
+        'filename': filename or (Path(filepath).name if isinstance(filepath, (str, os.PathLike)) else ''),
         'file_type': 'powerpoint',
         'parsed_at': datetime.now().isoformat(),
         'slides': [],
@@ -49,12 +51,16 @@ def parse_pptx(filepath):
             # Extract text from all shapes
             text_content = []
             for shape in slide.shapes:
-                if hasattr(shape, 'text') and shape.text.strip():
-                    text_content.append(shape.text.strip())
+                # shape.text walks the shape's XML, so read it only once
+                text = getattr(shape, 'text', None)
+                text = text.strip() if text else ''
+                if text:
+                    text_content.append(text)
 
+                    shape_type = shape.shape_type
                     shape_info = {
-                        'type': shape.shape_type.name if hasattr(shape.shape_type, 'name') else str(shape.shape_type),
-                        'text': shape.text.strip()
+                        'type': shape_type.name if hasattr(shape_type, 'name') else str(shape_type),
+                        'text': text
                     }
                     slide_data['shapes'].append(shape_info)
 
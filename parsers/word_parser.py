@@ -1,21 +1,23 @@
 """Word Document Parser - Extract text from DOCX files"""
 
 from docx import Document
+import os
 from datetime import datetime
 from pathlib import Path
 
-def parse_word(filepath):
+def parse_word(filepath, filename=None):
     """
     Parse Word document and extract text content
 
     Args:
-        filepath: Path to DOCX file
+        filepath: Path to DOCX file, or a binary file-like object
+        filename: Name to report in the result (required for file-like input)
 
     Returns:
         dict: Parsed Word document data
     """
     result = {
-        'filename': Path(filepath).name,
+        'filename': filename or (Path(filepath).name if isinstance(filepath, (str, os.PathLike)) else ''),
         'file_type': 'word',
         'parsed_at': datetime.now().isoformat(),
         'paragraphs': [],
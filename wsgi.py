@@ -0,0 +1,9 @@
+"""
+WSGI entrypoint for production servers, e.g.
+
+    gunicorn -k gthread --workers 4 --threads 4 wsgi:application
+"""
+
+from app import app
+
+application = app